@@ -0,0 +1,65 @@
+"""Compare-mode benchmark: batched comparison on a synthetic 5k-protein lab panel.
+
+python benchmarks/bench_compare.py [--proteins 5000] [--timesteps 48]
+"""
+import argparse, os, sys, tempfile, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import LabKineticsIndex, comparison_metrics, export_batch_comparison
+
+EV_TYPES = ["exosome", "microvesicle", "apoptotic"]
+
+def write_lab_csv(path, n_prot, n_t, n_cells=4, seed=0):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    n = n_t * n_cells * len(EV_TYPES)
+    keys = pd.MultiIndex.from_product([range(n_t), [f"C{i+1}" for i in range(n_cells)], EV_TYPES],
+                                      names=["timestep","cell_id","EV_type"]).to_frame(index=False)
+    vals = pd.DataFrame(rng.random((n, 1+n_prot)), columns=["EV_rate"]+[f"P{j}" for j in range(n_prot)])
+    pd.concat([keys, vals], axis=1).to_csv(path, index=False)
+
+def loop_metrics(lab, sim_arr, targets):
+    # Per-pair Python loop over the same pre-built index (O(1) mean lookups). This is not
+    # the original LabKinetics path, which scanned rows per query; that module is not in
+    # this tree, so the ratio below only measures batching against a looped index.
+    out = {}
+    for e, ev in enumerate(EV_TYPES):
+        for j, k in enumerate(targets):
+            s = np.array([sim_arr[e,j,i] for i,_ in enumerate(lab.timesteps)])
+            l = np.array([lab._mean(t, ev, k) for t in lab.timesteps])
+            out[(ev,k)] = (float(np.sqrt(np.mean((s-l)**2))), float(np.corrcoef(s,l)[0,1]))
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--proteins", type=int, default=5000)
+    ap.add_argument("--timesteps", type=int, default=48)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lab.csv")
+        write_lab_csv(path, args.proteins, args.timesteps)
+        t0 = time.perf_counter()
+        lab = LabKineticsIndex.from_csv(path)
+        t_load = time.perf_counter() - t0
+        targets = ["EV_rate"] + sorted(set().union(*(lab.protein_keys(ev) for ev in EV_TYPES)))
+        t0 = time.perf_counter()
+        lab_arr = lab.aligned(EV_TYPES, targets)
+        sim_arr = lab_arr + np.random.default_rng(1).normal(0, 0.05, lab_arr.shape)
+        comparison_metrics(sim_arr, lab_arr)
+        t_batch = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        export_batch_comparison(tmp, EV_TYPES, lab.timesteps, targets, sim_arr, lab_arr, lab.observed(EV_TYPES, targets))
+        t_export = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        loop_metrics(lab, sim_arr, targets)
+        t_loop = time.perf_counter() - t0
+    pairs = len(EV_TYPES) * len(targets)
+    print(f"{pairs} (EV type, target) pairs × {args.timesteps} timesteps")
+    print(f"  load (chunked index) : {t_load*1e3:9.1f} ms")
+    print(f"  batched align+metrics: {t_batch*1e3:9.1f} ms")
+    print(f"  consolidated export  : {t_export*1e3:9.1f} ms")
+    print(f"  indexed per-pair loop: {t_loop*1e3:9.1f} ms  ({t_loop/max(t_batch,1e-9):.0f}x batched time)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""CLI startup budget: account/notes commands must not load the simulation stack.
+
+python benchmarks/startup.py [--budget-ms 150] [--runs 7]
+
+For each command line, a fresh interpreter imports main, parses the arguments and
+resolves what would be dispatched (without running it). Fails (exit 1) if the median
+wall time exceeds the budget or a heavy module was imported on the way.
+"""
+import argparse, json, os, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("numpy", "pandas", "matplotlib", "Bio", "evelution")
+COMMANDS = [
+    ["--register_student", "--user_id", "bob", "--user_pass", ""],
+    ["--register_trainer", "--trainer_id", "alice", "--trainer_pass", "s3cret"],
+    ["--role", "student", "--user_id", "bob", "--note_list"],
+    ["--role", "student", "--user_id", "bob", "--note_new", "t", "--note_text", "x"],
+    ["--list_plugins", "--trainer_id", "alice"],
+]
+PROBE = """
+import json, sys
+import main
+args = main.build_parser().parse_args(json.loads(sys.argv[1]))
+actions = [fn.__name__ for when, fn in main.ACTIONS if when(args)]
+mode = args.mode or (None if actions else "basic")
+print(json.dumps({"mode": mode, "actions": actions, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY,)
+
+def probe(argv):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE, json.dumps(argv)], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - t0, json.loads(out)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget-ms", type=float, default=150.0)
+    ap.add_argument("--runs", type=int, default=7)
+    args = ap.parse_args()
+    failed = False
+    for argv in COMMANDS:
+        times, info = [], None
+        for _ in range(args.runs):
+            dt, info = probe(argv)
+            times.append(dt)
+        ms = statistics.median(times) * 1e3
+        bad = ms > args.budget_ms or info["heavy"] or info["mode"] is not None
+        failed |= bool(bad)
+        print(f"{' '.join(argv):70s} {ms:7.1f} ms  mode={info['mode']} actions={info['actions']}"
+              f"{'  heavy=' + ','.join(info['heavy']) if info['heavy'] else ''}  {'FAIL' if bad else 'ok'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Benchmark suite for the simulation hot paths, with machine-tagged baselines.
+
+python benchmarks/suite.py run [--quick] [--save-baseline] [--out results.json]
+python benchmarks/suite.py compare results.json [--baseline FILE] [--threshold 0.2]
+
+Every case runs in a fresh process so peak RSS is per case. Reported per case:
+median wall time over repeats, steps/sec (and cells/sec where a population is
+simulated), whole-process peak RSS (imports and case setup included), how far the
+runs pushed RSS past the setup level, and the tracemalloc peak of live memory in one
+extra run. `compare` gates on wall time and whole-process RSS. `run` exits 1 if any case errors. `compare` exits 1 when a case errored,
+is missing, or is slower / larger than the baseline by more than the threshold, and
+2 when there is no baseline for this machine.
+"""
+import argparse, hashlib, json, os, platform, statistics, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines")
+sys.path.insert(0, ROOT)
+
+# --- cases: each returns (callable, steps, cells) -------------------------------------
+
+def case_sim_run(cells=3, T=60):
+    from scenario import make_cells, make_supervisor
+    from evelution.models.simulation import Simulation
+    def run():
+        Simulation(cells=make_cells(cells), supervisor=make_supervisor()).run(T=T, dt=1.0)
+    return run, T, cells
+
+def case_multiagent(edges=2, T=60):
+    from scenario import make_cells, make_supervisor
+    from evelution.multiagent.eco import MultiAgentSimulation, EVExchangeGraph, ExchangeEdge
+    n = edges + 1
+    def run():
+        cells = make_cells(n)
+        graph = EVExchangeGraph(edges=[ExchangeEdge(f"C{i+1}", f"C{(i+1)%n+1}", 0.1) for i in range(edges)])
+        MultiAgentSimulation(cells=cells, supervisor=make_supervisor(), exchange=graph).run(T=T, dt=1.0)
+    return run, T, n
+
+def case_export_csv(cells=30, T=240):
+    from scenario import make_cells, make_supervisor
+    from evelution.models.simulation import Simulation
+    field = Simulation(cells=make_cells(cells), supervisor=make_supervisor()).run(T=T, dt=1.0)
+    path = os.path.join(tempfile.mkdtemp(), "ev_time_series.csv")
+    return (lambda: field.export_time_series_csv(path)), T, 0
+
+def _lab_csv(rows_per_step, T, proteins=8):
+    import numpy as np
+    path = os.path.join(tempfile.mkdtemp(), "lab.csv")
+    rng = np.random.default_rng(0)
+    evs = ["exosome", "microvesicle"]
+    with open(path, "w") as f:
+        f.write("timestep,cell_id,EV_type,EV_rate," + ",".join(f"P{j}" for j in range(proteins)) + "\n")
+        for t in range(T):
+            for r in range(rows_per_step):
+                vals = ",".join(f"{v:.4f}" for v in rng.random(1+proteins))
+                f.write(f"{t},C{r+1},{evs[r % 2]},{vals}\n")
+    return path, evs
+
+def case_lab_kinetics(rows_per_step=50, T=60):
+    from evelution.data.labdata import LabKinetics
+    path, evs = _lab_csv(rows_per_step, T)
+    def run():
+        lab = LabKinetics.from_csv(path)
+        for ev in evs:
+            for t in lab.timesteps:
+                lab.mean_rate(t, ev)
+    return run, T, 0
+
+def case_lab_index(rows_per_step=50, T=60):
+    from main import LabKineticsIndex
+    path, evs = _lab_csv(rows_per_step, T)
+    def run():
+        lab = LabKineticsIndex.from_csv(path)
+        for ev in evs:
+            for t in lab.timesteps:
+                lab.mean_rate(t, ev)
+    return run, T, 0
+
+def case_snapshot_diff(cells=30, T=60):
+    from scenario import make_cells, make_supervisor
+    from evelution.models.simulation import Simulation
+    from evelution.ui.snapshot import save_state, diff_states
+    sim = Simulation(cells=make_cells(cells), supervisor=make_supervisor())
+    sim.run(T=T, dt=1.0)
+    def run():
+        a = save_state(sim)
+        b = save_state(sim)
+        diff_states(a, b)
+    return run, 1, 0
+
+def case_contribution(cells=30, T=60):
+    from scenario import make_cells, make_supervisor
+    from evelution.models.simulation import Simulation
+    from evelution.analysis.explain import contribution_breakdown
+    sim = Simulation(cells=make_cells(cells), supervisor=make_supervisor())
+    def run():
+        for t in range(T):
+            scale = sim.supervisor.active_scale(t)
+            for c in sim.cells:
+                contribution_breakdown(c, scale, sim.rT, "exosome")
+    return run, T, cells
+
+CASES = {
+    "sim_run": case_sim_run, "multiagent": case_multiagent, "export_csv": case_export_csv,
+    "lab_kinetics": case_lab_kinetics, "lab_index": case_lab_index,
+    "snapshot_diff": case_snapshot_diff, "contribution": case_contribution,
+}
+
+def plan(quick=False):
+    pops, horizons = ([3, 30], [60]) if quick else ([3, 30, 300, 3000], [60, 240])
+    edges = [2, 20] if quick else [2, 20, 200, 2000]
+    out = [("sim_run", {"cells":n, "T":T}) for n in pops for T in horizons]
+    out += [("multiagent", {"edges":e, "T":60}) for e in edges]
+    out += [("export_csv", {"cells":30, "T":240}),
+            ("lab_kinetics", {"rows_per_step":50, "T":60}), ("lab_index", {"rows_per_step":50, "T":60}),
+            ("snapshot_diff", {"cells":30 if quick else 300, "T":60}),
+            ("contribution", {"cells":30 if quick else 300, "T":60})]
+    return out
+
+def case_id(name, params):
+    return name + "[" + ",".join(f"{k}={v}" for k, v in sorted(params.items())) + "]"
+
+# --- measurement ----------------------------------------------------------------------
+
+def _peak_rss_bytes():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def measure(name, params, repeats=3):
+    """Runs inside a fresh worker process.
+
+    process_peak_rss_bytes is ru_maxrss for the whole worker: interpreter, imports and the
+    case's setup included. rss_above_setup_bytes is how far the case's own runs pushed that
+    high-water mark past the level reached by setup (0 if they stayed below it).
+    traced_peak_bytes is the peak of Python-tracked live memory during one run.
+    """
+    import tracemalloc
+    fn, steps, cells = CASES[name](**params)
+    rss_setup = _peak_rss_bytes()
+    fn()  # warm-up (imports, caches)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_peak = _peak_rss_bytes()
+    wall = statistics.median(times)
+    res = {"case": name, "params": params, "wall_s": wall, "wall_min_s": min(times), "repeats": repeats,
+           "steps_per_s": steps / wall if wall > 0 else None, "process_peak_rss_bytes": rss_peak,
+           "rss_above_setup_bytes": max(0, rss_peak - rss_setup), "traced_peak_bytes": traced_peak}
+    if cells:
+        res["cells_per_s"] = cells * steps / wall if wall > 0 else None
+    return res
+
+def machine_info():
+    import numpy as np
+    info = {"node": platform.node(), "machine": platform.machine(), "system": platform.system(),
+            "processor": platform.processor(), "cpus": os.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__}
+    # No hostname: CI runners get a fresh one each job, which would never match a baseline
+    key = json.dumps({k: info[k] for k in ("machine","system","processor","cpus","python")}, sort_keys=True)
+    info["tag"] = f"{info['system'].lower()}-{info['machine']}-{info['cpus']}cpu-{hashlib.sha1(key.encode()).hexdigest()[:8]}"
+    return info
+
+def run_suite(quick=False, repeats=3, only=None):
+    ctx = mp.get_context("spawn")
+    results = []
+    for name, params in plan(quick):
+        if only and name not in only:
+            continue
+        cid = case_id(name, params)
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                res = pool.submit(measure, name, params, repeats).result()
+            except Exception as e:
+                res = {"case": name, "params": params, "error": f"{type(e).__name__}: {e}"}
+        res["id"] = cid
+        results.append(res)
+        if "error" in res:
+            print(f"{cid:45s}  ERROR {res['error']}")
+        else:
+            cps = f"  {res['cells_per_s']:12.0f} cells/s" if res.get("cells_per_s") else ""
+            print(f"{cid:45s} {res['wall_s']*1e3:10.2f} ms  process rss {res['process_peak_rss_bytes']/2**20:7.1f} MiB "
+                  f"(+{res['rss_above_setup_bytes']/2**20:.1f} over setup)  traced peak {res['traced_peak_bytes']/2**20:7.2f} MiB{cps}")
+    return {"machine": machine_info(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": quick, "results": results}
+
+def compare(current, baseline, threshold=0.2, rss_threshold=0.2):
+    # Errored cases and baseline cases missing from the current run count as failures
+    base = {r["id"]: r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for r in current["results"]:
+        b = base.get(r["id"])
+        if "error" in r:
+            print(f"{r['id']:45s}  ERROR {r['error']}")
+            regressions.append(r["id"])
+            continue
+        if b is None:
+            print(f"{r['id']:45s}  new case, no baseline")
+            continue
+        dt = r["wall_s"] / b["wall_s"] - 1.0 if b["wall_s"] > 0 else 0.0
+        # whole-process RSS (setup included), so this catches footprint growth, not just the hot path
+        dm = r["process_peak_rss_bytes"] / b["process_peak_rss_bytes"] - 1.0 if b["process_peak_rss_bytes"] > 0 else 0.0
+        flag = dt > threshold or dm > rss_threshold
+        print(f"{r['id']:45s} time {dt*100:+7.1f}%  rss {dm*100:+7.1f}%  {'REGRESSION' if flag else 'ok'}")
+        if flag:
+            regressions.append(r["id"])
+    for cid in sorted(set(base) - {r["id"] for r in current["results"]}):
+        print(f"{cid:45s}  MISSING from current run")
+        regressions.append(cid)
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--quick", action="store_true")
+    r.add_argument("--repeats", type=int, default=3)
+    r.add_argument("--only", type=str, default="", help="comma-separated case names")
+    r.add_argument("--out", type=str, default="outputs/bench/results.json")
+    r.add_argument("--save-baseline", action="store_true")
+    c = sub.add_parser("compare")
+    c.add_argument("current")
+    c.add_argument("--baseline", type=str, default="")
+    c.add_argument("--threshold", type=float, default=0.2)
+    c.add_argument("--rss-threshold", type=float, default=0.2)
+    args = ap.parse_args()
+    if args.cmd == "run":
+        res = run_suite(args.quick, args.repeats, [s for s in args.only.split(",") if s])
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(res, f, indent=2)
+        print("Results →", args.out)
+        if args.save_baseline:
+            os.makedirs(BASELINES, exist_ok=True)
+            p = os.path.join(BASELINES, res["machine"]["tag"] + ("-quick" if args.quick else "") + ".json")
+            with open(p, "w") as f:
+                json.dump(res, f, indent=2)
+            print("Baseline →", p)
+        errors = [r["id"] for r in res["results"] if "error" in r]
+        if errors:
+            print(f"{len(errors)} case(s) failed: {', '.join(errors)}")
+            return 1
+        return 0
+    else:
+        with open(args.current) as f:
+            cur = json.load(f)
+        path = args.baseline or os.path.join(BASELINES, cur["machine"]["tag"] + ("-quick" if cur.get("quick") else "") + ".json")
+        if not os.path.exists(path):
+            print(f"No baseline for this machine ({path}); run with --save-baseline first or pass --baseline.")
+            return 2
+        with open(path) as f:
+            base = json.load(f)
+        regressions = compare(cur, base, args.threshold, args.rss_threshold)
+        print(f"{len(regressions)} regression(s) vs {path}")
+        return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Worker process for the Streamlit sandbox's live simulation panel.
+
+Started with the "spawn" method, so the child never inherits locks from the Streamlit
+server's threads; keep this module's imports light, the child re-imports it.
+"""
+import queue
+
+from scenario import make_cells, make_supervisor, make_exchange
+
+# A put blocked this long means the page that started the run is gone
+ORPHAN_TIMEOUT_S = 60.0
+
+def cell_summary(c):
+    return {"S":float(c.S), "ghost":float(c.ghost), "fairy":float(c.fairy),
+            "I_mean":sum(c.I)/len(c.I), "E_mean":sum(c.E)/len(c.E)}
+
+def stream_simulation(q, kind="single", T=60, dt=1.0):
+    """Run one simulation, then replay it on queue `q`.
+
+    Simulation.run(T) has no per-step hook, so nothing is published until the run has
+    finished. Then: ("step", t, {EV_type: rate}) per timestep, ("cells", before, after)
+    with per-cell state summaries, and ("done",); ("error", msg) on failure. `q` is
+    bounded, so a slow consumer throttles the replay rather than buffering all of it;
+    if nobody drains it for ORPHAN_TIMEOUT_S the worker exits.
+    """
+    def put(msg):
+        q.put(msg, timeout=ORPHAN_TIMEOUT_S)
+    try:
+        from evelution.models.simulation import Simulation
+        from evelution.multiagent.eco import MultiAgentSimulation
+        cells = make_cells()
+        sup = make_supervisor()
+        before = {c.cell_id: cell_summary(c) for c in cells}
+        if kind == "multi":
+            sim = MultiAgentSimulation(cells=cells, supervisor=sup, exchange=make_exchange())
+        else:
+            sim = Simulation(cells=cells, supervisor=sup)
+        field = sim.run(T=T, dt=dt)
+        if field is None:
+            raise RuntimeError(f"{type(sim).__name__}.run returned no field")
+        series = field.type_time_series
+        for t in range(T):
+            put(("step", t, {ev: float(s.get(t, 0.0)) for ev, s in series.items()}))
+        put(("cells", before, {c.cell_id: cell_summary(c) for c in sim.cells}))
+        put(("done",))
+    except queue.Full:
+        return
+    except Exception as e:
+        try:
+            put(("error", f"{type(e).__name__}: {e}"))
+            put(("done",))
+        except queue.Full:
+            return
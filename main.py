@@ -1,53 +1,124 @@
 
 from __future__ import annotations
-import os, argparse, json
-from evelution.models.cell import CellAgent
-from evelution.models.simulation import Simulation
-from evelution.models.supervisor import Supervisor
-from evelution.data.io import Kinetics
-from evelution.metrics.metrics import export_metrics_csv
-from evelution.ui.snapshot import save_state, diff_states
-from evelution.ui.story import StoryStep, run_story
-from evelution.analysis.explain import contribution_breakdown
-from evelution.utils.permalink import to_permalink, from_permalink
-from evelution.multiagent.eco import MultiAgentSimulation, EVExchangeGraph, ExchangeEdge
-
-def make_cells():
-    cells = []
-    for i in range(3):
-        c = CellAgent(
-            cell_id=f"C{i+1}",
-            cell_type="generic",
-            I=[0.6,0.5,0.4,0.5,0.6],
-            E=[0.5,0.5,0.5,0.5,0.5],
-            ghost=0.0,
-            fairy=0.3,
-            S=0.6,
-            P={"CD9":0.6,"CD63":0.5,"CD81":0.55,"TSG101":0.4,"ALIX":0.45},
-        )
-        cells.append(c)
-    return cells
-
-def make_supervisor():
-    sup = Supervisor()
-    sup.stress_windows = {"hypoxia":[range(10,20)], "oxidative":[range(30,40)]}
-    sup.lambdas = {"hypoxia":1.2,"oxidative":0.9,"metabolic":0.85}
-    return sup
-
-def run_basic(T=60):
+import os, argparse, json, time
+from contextlib import nullcontext
+from scenario import make_cells, make_supervisor, make_exchange
+# Everything heavier (numpy/pandas, the evelution model stack) is imported inside the
+# function that needs it, so e.g. `--note_list` never loads the simulation.
+
+# --- Opt-in profiling (--profile) -------------------------------------------------------
+# Disabled: phase() hands back one shared nullcontext, so instrumented code pays a global
+# lookup and nothing else. Enabled: wall-clock spans (Chrome trace), per-run steps/cells per
+# second and cProfile self-time per module. tracemalloc is a separate opt-in
+# (--profile_memory) because it slows allocation-heavy code and would skew the rates.
+PROFILER = None
+
+class RunProfiler:
+    def __init__(self, mode, memory=False):
+        import cProfile, tracemalloc
+        self.mode = mode
+        self.memory = memory
+        self.spans = []
+        self.runs = []
+        self._t0 = time.perf_counter()
+        if memory:
+            tracemalloc.start()
+        self._prof = cProfile.Profile()
+        self._prof.enable()
+
+    def span(self, name, **meta):
+        from contextlib import contextmanager
+        @contextmanager
+        def _span():
+            t = time.perf_counter()
+            try:
+                yield
+            finally:
+                dur = time.perf_counter() - t
+                self.spans.append({"name":name, "start_s":t-self._t0, "dur_s":dur, **meta})
+                if "T" in meta:
+                    run = {"name":name, "T":meta["T"], "cells":meta.get("cells", 0), "wall_s":dur,
+                           "steps_per_s":meta["T"]/dur if dur > 0 else None}
+                    if meta.get("cells"):
+                        run["cells_per_s"] = meta["cells"]*meta["T"]/dur if dur > 0 else None
+                    self.runs.append(run)
+        return _span()
+
+    @staticmethod
+    def module_of(filename):
+        """Dotted module for evelution files, top-level package for everything else."""
+        if filename.startswith(("~", "<")):
+            return "(builtins)"
+        parts = filename.replace("\\", "/").removesuffix(".py").split("/")
+        if "evelution" in parts:
+            mod = ".".join(parts[len(parts)-1-parts[::-1].index("evelution"):])
+            return mod.removesuffix(".__init__")
+        for root in ("site-packages", "dist-packages"):
+            if root in parts:
+                return parts[len(parts)-parts[::-1].index(root)]
+        lib = [i for i, p in enumerate(parts[:-1]) if p.startswith("python3")]
+        return parts[lib[-1]+1] if lib else parts[-1]
+
+    def finish(self, outdir="outputs/profile"):
+        import pstats, tracemalloc
+        self._prof.disable()
+        wall = time.perf_counter() - self._t0
+        alloc_peak = None
+        if self.memory:
+            _, alloc_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        stats = pstats.Stats(self._prof).stats
+        modules, top = {}, []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.items():
+            m = modules.setdefault(self.module_of(filename), {"self_s":0.0, "calls":0})
+            m["self_s"] += tt
+            m["calls"] += nc
+            top.append({"function":f"{os.path.basename(filename)}:{line}({func})", "self_s":tt, "cum_s":ct, "calls":nc})
+        top.sort(key=lambda r: -r["self_s"])
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        os.makedirs(outdir, exist_ok=True)
+        base = os.path.join(outdir, f"{self.mode}-{stamp}")
+        summary = {"mode":self.mode, "created":stamp, "wall_s":wall, "tracemalloc":self.memory,
+                   "alloc_peak_bytes":alloc_peak, "runs":self.runs,
+                   "modules":dict(sorted(modules.items(), key=lambda kv: -kv[1]["self_s"])),
+                   "spans":self.spans, "top_functions":top[:30]}
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        events = [{"name":sp["name"], "ph":"X", "pid":os.getpid(), "tid":0, "ts":sp["start_s"]*1e6, "dur":sp["dur_s"]*1e6,
+                   "args":{k:v for k,v in sp.items() if k not in ("name","start_s","dur_s")}} for sp in self.spans]
+        with open(base + ".trace.json", "w") as f:
+            json.dump({"traceEvents":events, "displayTimeUnit":"ms"}, f)
+        print(f"Profile written to {base}.json (open {base}.trace.json in chrome://tracing or Perfetto)")
+        return summary
+
+_NO_SPAN = nullcontext()
+
+def phase(name, **meta):
+    return _NO_SPAN if PROFILER is None else PROFILER.span(name, **meta)
+
+def run_basic(T=60, cache=None):
+    from evelution.models.simulation import Simulation
+    from evelution.data.io import Kinetics
+    from evelution.metrics.metrics import export_metrics_csv
     os.makedirs("outputs", exist_ok=True)
     cells = make_cells()
     sup = make_supervisor()
     sim = Simulation(cells=cells, supervisor=sup)
+    cfg = run_config(cells, sup, T)
     if os.path.exists("examples/kinetics.csv"):
         sim.kinetics = Kinetics.from_csv("examples/kinetics.csv")
-    field = sim.run(T=T, dt=1.0)
-    field.export_time_series_csv("outputs/ev_time_series.csv")
-    export_metrics_csv("outputs/metrics.csv", [("rmse_placeholder", 0.0), ("r_placeholder", 0.0)])
+        cfg["kinetics_sha256"] = file_sha256("examples/kinetics.csv")
+    field, metrics = cached_run(sim, cfg, cache, [("rmse_placeholder", 0.0), ("r_placeholder", 0.0)])
+    with phase("export_time_series_csv"):
+        field.export_time_series_csv("outputs/ev_time_series.csv")
+    export_metrics_csv("outputs/metrics.csv", metrics)
     print("Run complete. See outputs/")
-    return sim, field
+    return sim, field, cfg
 
 def run_story_mode():
+    from evelution.models.simulation import Simulation
+    from evelution.ui.snapshot import save_state, diff_states
+    from evelution.ui.story import StoryStep, run_story
     os.makedirs("outputs", exist_ok=True)
     cells = make_cells()
     sup = make_supervisor()
@@ -57,141 +128,846 @@ def run_story_mode():
         StoryStep("Electro: ROS pulse", {"Electro":(0.9,[15,30])}, {"C2":{"ghost":0.2}}, "ROS engages ceramide; rate shifts", True),
         StoryStep("Flora: TGF-β dosing", {"Flora":(1.1,[30,45])}, {"C3":{"S":0.7}}, "Routing via syntenin/ALIX", False),
     ]
-    outputs = run_story(sim, steps, segment_len=15)
+    with phase("run_story", T=15*len(steps), cells=len(cells)):
+        outputs = run_story(sim, steps, segment_len=15)
     snaps = []
     for i,(info, field) in enumerate(outputs):
-        snap = save_state(sim)
+        with phase("save_state", segment=i):
+            snap = save_state(sim)
         snaps.append(snap)
     if len(snaps)>=2:
-        diff = diff_states(snaps[-2], snaps[-1])
+        with phase("diff_states"):
+            diff = diff_states(snaps[-2], snaps[-1])
         with open("outputs/story_diff.json","w") as f:
             json.dump(diff, f, indent=2)
     print("Story mode complete. See outputs/story_diff.json")
     return sim
 
 def explain_one(sim):
+    from evelution.analysis.explain import contribution_breakdown
     os.makedirs("outputs", exist_ok=True)
     c = sim.cells[0]
-    scale = sim.supervisor.active_scale(0)
-    info = contribution_breakdown(c, scale, sim.rT, "exosome")
+    with phase("contribution_breakdown"):
+        scale = sim.supervisor.active_scale(0)
+        info = contribution_breakdown(c, scale, sim.rT, "exosome")
     with open("outputs/explain_C1.json","w") as f:
         json.dump(info, f, indent=2)
     print("Explain-Why written to outputs/explain_C1.json")
 
-def make_permalink(sim):
-    cfg = {
-        "cells":[{"id":c.cell_id,"I":c.I,"E":c.E,"S":c.S,"ghost":c.ghost,"fairy":c.fairy} for c in sim.cells],
-        "lambdas": sim.supervisor.lambdas,
-        "stress": {k:[[r.start,r.stop] for r in v] for k,v in sim.supervisor.stress_windows.items()},
-        "seed": 42,
-        "notes": "Example permalink"
+def plain(v):
+    # numpy arrays/scalars → lists/floats so configs and cache metadata stay JSON-serializable
+    if hasattr(v, "tolist"):
+        return v.tolist()
+    if isinstance(v, dict):
+        return {k: plain(x) for k, x in v.items()}
+    return v
+
+def run_config(cells, sup, T=60, dt=1.0, seed=42):
+    return {
+        "cells":[{"id":c.cell_id, "cell_type":c.cell_type,
+                  **{a:plain(getattr(c, a)) for a in ("I","E","S","ghost","fairy","P")}} for c in cells],
+        "lambdas": plain(sup.lambdas),
+        "stress": {k:[[r.start,r.stop] for r in v] for k,v in sup.stress_windows.items()},
+        "seed": seed,
+        "T": T,
+        "dt": dt,
     }
+
+def make_permalink(sim, cfg=None, mode=None, T=60):
+    """Write outputs/permalink.txt.
+
+    Pass the pre-run `cfg` a cached run was keyed on and `--permalink` can rehydrate it.
+    Runs that are not cached (story, multi) pass `mode` instead; their token records the
+    post-run state and is marked with that mode so rehydration says it has nothing to load.
+    """
+    from evelution.utils.permalink import to_permalink
+    cfg = dict(cfg or run_config(sim.cells, sim.supervisor, T))
+    if mode is not None:
+        cfg["mode"] = mode
+    cfg["notes"] = "Example permalink"
     s = to_permalink(cfg)
     with open("outputs/permalink.txt","w") as f:
         f.write(s)
     print("Permalink token in outputs/permalink.txt")
     return s
 
+def emit_repro(mode, outdir="outputs"):
+    # repro.json stamp: enough to tell which code and interpreter produced the outputs
+    import platform, sys
+    os.makedirs(outdir, exist_ok=True)
+    stamp = {"mode":mode, "created":time.strftime("%Y-%m-%dT%H:%M:%S"), "argv":sys.argv[1:],
+             "engine":engine_version(), "python":platform.python_version(), "platform":platform.platform()}
+    path = os.path.join(outdir, "repro.json")
+    with open(path, "w") as f:
+        json.dump(stamp, f, indent=2)
+    return path
+
 def run_multiagent():
+    from evelution.multiagent.eco import MultiAgentSimulation
     cells = make_cells()
     sup = make_supervisor()
-    exchange = EVExchangeGraph(edges=[ExchangeEdge("C1","C2",0.2), ExchangeEdge("C2","C3",0.1)])
-    sim = MultiAgentSimulation(cells=cells, supervisor=sup, exchange=exchange)
-    sim.run(T=60, dt=1.0)
+    sim = MultiAgentSimulation(cells=cells, supervisor=sup, exchange=make_exchange())
+    with phase("MultiAgentSimulation.run", T=60, cells=len(cells)):
+        sim.run(T=60, dt=1.0)
     print("Multi-agent run complete.")
     return sim
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", choices=["basic","story","explain","multi","teach","compare","game"], default="basic")
-    parser.add_argument("--lab", type=str, default="")
-    parser.add_argument("--tutorial", action="store_true")
-    parser.add_argument("--photo", action="store_true")
-    parser.add_argument("--theme", type=str, default="")
-    parser.add_argument("--trainer_id", type=str, default="")
-    parser.add_argument("--trainer_pass", type=str, default="")
-    parser.add_argument("--register_trainer", action="store_true")
-    parser.add_argument("--dump_lessons", action="store_true")
-    parser.add_argument("--edit_lessons", type=str, default="")
-    parser.add_argument("--add_plugin", type=str, default="")
-    parser.add_argument("--list_plugins", action="store_true")
-    parser.add_argument("--role", type=str, default="student", choices=["student","trainer"])
-    parser.add_argument("--user_id", type=str, default="")
-    parser.add_argument("--user_pass", type=str, default="")
-    parser.add_argument("--register_student", action="store_true")
-    parser.add_argument("--note_new", type=str, default="")
-    parser.add_argument("--note_text", type=str, default="")
-    parser.add_argument("--note_list", action="store_true")
-    parser.add_argument("--note_export", type=str, default="")
-    parser.add_argument("--note_format", type=str, default="txt")
-    parser.add_argument("--var", type=str, default="E_O2")
-    parser.add_argument("--cell_id", type=str, default="C1")
-    parser.add_argument("--import_kind", type=str, default="nta", choices=["nta","trps","flow"])
-    parser.add_argument("--path", type=str, default="")
-    parser.add_argument("--meta", type=str, default="")
-    parser.add_argument("--figA", type=str, default="")
-    parser.add_argument("--figB", type=str, default="")
-    args = parser.parse_args()
-    if args.mode=="basic":
-        sim, _ = run_basic()
-        explain_one(sim)
-        make_permalink(sim)
-    elif args.mode=="story":
-        sim = run_story_mode()
-        explain_one(sim)
-        make_permalink(sim)
-    elif args.mode=="explain":
-        sim, _ = run_basic()
-        explain_one(sim)
-    elif args.mode=="multi":
-        emit_repro("multi")
-        sim = run_multiagent()
-        explain_one(sim)
-        make_permalink(sim)
-
-
-
-elif args.mode=="compare":
-        emit_repro("compare")
+# --- Content-addressed run cache ----------------------------------------------------------
+# Key: sha256 of the canonical permalink config (minus notes) + engine version. An entry
+# holds the field as arrays (field.npz), the exported time-series CSV, metrics and the
+# post-run cell state; meta.json records sha256 of both files and is re-checked on read.
+ENGINE_VERSION = "1"  # bump when Simulation semantics change
+
+def engine_version():
+    try:
+        import evelution
+        v = getattr(evelution, "__version__", "")
+    except ImportError:
+        v = ""
+    return f"{ENGINE_VERSION}+{v}" if v else ENGINE_VERSION
+
+def run_key(cfg):
+    keyed = {k:v for k,v in cfg.items() if k != "notes"}
+    blob = json.dumps({"config":keyed, "engine":engine_version()}, sort_keys=True, separators=(",",":"))
+    import hashlib
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+CELL_STATE = ("I","E","S","ghost","fairy","P")
+
+class CachedField:
+    """Field rehydrated from the run cache: same type/protein series dicts, same CSV export."""
+    def __init__(self, type_time_series, protein_time_series, csv_path):
+        self.type_time_series = type_time_series
+        self.protein_time_series = protein_time_series
+        self._csv_path = csv_path
+
+    def export_time_series_csv(self, path):
+        import shutil
+        shutil.copyfile(self._csv_path, path)
+
+class RunCache:
+    def __init__(self, root="outputs/cache", max_bytes=512*2**20):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """(CachedField, meta) for a verified entry, else None; corrupt entries are dropped."""
+        import shutil
+        import numpy as np
+        d = self._dir(key)
+        meta_path = os.path.join(d, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            for name, digest in meta["sha256"].items():
+                if file_sha256(os.path.join(d, name)) != digest:
+                    raise ValueError(f"checksum mismatch for {name}")
+            with np.load(os.path.join(d, "field.npz"), allow_pickle=False) as z:
+                rates, prot = z["rates"], z["proteins"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Run cache: dropping corrupt entry {key[:12]} ({e})")
+            shutil.rmtree(d, ignore_errors=True)
+            return None
+        ts, evs, keys = meta["timesteps"], meta["ev_types"], meta["protein_keys"]
+        type_ts = {ev: {t: float(v) for t, v in zip(ts, rates[e]) if not np.isnan(v)} for e, ev in enumerate(evs)}
+        prot_ts = {}
+        for e, ev in enumerate(evs):
+            per = {k: {t: float(v) for t, v in zip(ts, prot[e, j]) if not np.isnan(v)} for j, k in enumerate(keys)}
+            per = {k: v for k, v in per.items() if v}
+            if per or ev in meta["protein_evs"]:
+                prot_ts[ev] = per
+        try:
+            os.utime(meta_path)  # LRU recency
+        except OSError:
+            pass  # read-only cache: still a hit, just not reordered for eviction
+        return CachedField(type_ts, prot_ts, os.path.join(d, "ev_time_series.csv")), meta
+
+    def put(self, key, cfg, field, cells, metrics):
+        """Store one run; best-effort, so a failure is logged and the caller keeps its result."""
+        import shutil, tempfile
+        import numpy as np
+        tmp = None
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+            evs = sorted(field.type_time_series)
+            pts = field.protein_time_series
+            ts = sorted({t for s in field.type_time_series.values() for t in s} |
+                        {t for per in pts.values() for s in per.values() for t in s})
+            keys = sorted({k for per in pts.values() for k in per})
+            col = {t:i for i,t in enumerate(ts)}
+            rates = np.full((len(evs), len(ts)), np.nan)
+            prot = np.full((len(evs), len(keys), len(ts)), np.nan)
+            for e, ev in enumerate(evs):
+                for t, v in field.type_time_series[ev].items():
+                    rates[e, col[t]] = v
+                for j, k in enumerate(keys):
+                    for t, v in pts.get(ev, {}).get(k, {}).items():
+                        prot[e, j, col[t]] = v
+            np.savez_compressed(os.path.join(tmp, "field.npz"), rates=rates, proteins=prot)
+            field.export_time_series_csv(os.path.join(tmp, "ev_time_series.csv"))
+            meta = {"key":key, "engine":engine_version(), "config":{k:v for k,v in cfg.items() if k != "notes"},
+                    "created":time.strftime("%Y-%m-%dT%H:%M:%S"), "timesteps":ts, "ev_types":evs,
+                    "protein_keys":keys, "protein_evs":sorted(pts), "metrics":[list(m) for m in metrics],
+                    "cells_after":[{"id":c.cell_id, **{a:plain(getattr(c, a)) for a in CELL_STATE}} for c in cells],
+                    "sha256":{n:file_sha256(os.path.join(tmp, n)) for n in ("field.npz","ev_time_series.csv")}}
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            d = self._dir(key)
+            os.makedirs(os.path.dirname(d), exist_ok=True)
+            shutil.rmtree(d, ignore_errors=True)
+            os.replace(tmp, d)
+            self.evict(keep=key)
+        except Exception as e:
+            print(f"Run cache: could not store {key[:12]} ({type(e).__name__}: {e})")
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    def evict(self, keep=None):
+        # Drop least recently used entries until the cache fits in max_bytes
+        import shutil
+        entries = []
+        for shard in os.listdir(self.root):
+            sd = os.path.join(self.root, shard)
+            if shard.startswith(".") or not os.path.isdir(sd):
+                continue
+            for key in os.listdir(sd):
+                d = os.path.join(sd, key)
+                meta = os.path.join(d, "meta.json")
+                size = sum(os.path.getsize(os.path.join(d, n)) for n in os.listdir(d))
+                entries.append((os.path.getmtime(meta) if os.path.exists(meta) else 0.0, size, key, d))
+        total = sum(e[1] for e in entries)
+        for _, size, key, d in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+
+def cached_run(sim, cfg, cache, metrics, T=None):
+    """Serve sim.run(T) from the cache when the config was run before; otherwise run and store.
+
+    The RNGs are seeded from cfg["seed"] before running, so the stored field is the
+    result for that seed and a hit reproduces it.
+    """
+    import random
+    import numpy as np
+    T = cfg["T"] if T is None else T
+    key = run_key(cfg)
+    hit = cache.get(key) if cache is not None else None
+    if hit is not None:
+        field, meta = hit
+        state = {c["id"]: c for c in meta["cells_after"]}
+        for c in sim.cells:
+            for a in CELL_STATE:
+                if c.cell_id in state:
+                    v = state[c.cell_id][a]
+                    setattr(c, a, np.asarray(v) if isinstance(getattr(c, a, None), np.ndarray) else v)
+        print(f"Run cache hit {key[:12]}")
+        return field, [tuple(m) for m in meta["metrics"]]
+    random.seed(cfg["seed"])
+    np.random.seed(cfg["seed"])
+    with phase("Simulation.run", T=T, cells=len(sim.cells)):
+        field = sim.run(T=T, dt=cfg.get("dt", 1.0))
+    if cache is not None:
+        cache.put(key, cfg, field, sim.cells, metrics)
+    return field, metrics
+
+# Modes whose permalink tokens name a cached run (compare runs are cached but make no token)
+REHYDRATABLE = ("basic", "explain")
+
+def rehydrate_permalink(token, cache):
+    """(cfg, cached (field, meta) or None) for a permalink token."""
+    from evelution.utils.permalink import from_permalink
+    cfg = from_permalink(token)
+    if cfg.get("mode", "basic") not in REHYDRATABLE:
+        return cfg, None
+    return cfg, cache.get(run_key(cfg))
+
+SWEEP_COLUMNS = ["point_id","replicate","seed","shift","lambda_hypoxia","lambda_oxidative","lambda_metabolic","EV_type","timestep","EV_rate"]
+
+def point_seed(base_seed, point_id):
+    # Hash of (seed, point id): stable when the grid is extended or reordered
+    import hashlib
+    return int.from_bytes(hashlib.sha256(f"{base_seed}:{point_id}".encode()).digest()[:4], "big")
+
+def sweep_points(lambda_grid, shift_grid, replicates, base_seed=42):
+    # Deterministic parameter points; the seed depends only on the point, not on the worker
+    import itertools
+    points = []
+    for lh, lo, lm, shift, rep in itertools.product(lambda_grid, lambda_grid, lambda_grid, shift_grid, range(replicates)):
+        pid = f"h{lh:g}_o{lo:g}_m{lm:g}_s{shift}_r{rep}"
+        seed = point_seed(base_seed, pid)
+        points.append({"point_id":pid, "replicate":rep, "seed":seed, "shift":shift,
+                       "lambdas":{"hypoxia":lh,"oxidative":lo,"metabolic":lm}})
+    return points
+
+def run_sweep_point(point, T=60):
+    import random
+    import numpy as np
+    from evelution.models.simulation import Simulation
+    random.seed(point["seed"])
+    np.random.seed(point["seed"])
+    cells = make_cells()
+    sup = make_supervisor()
+    sup.lambdas = dict(sup.lambdas, **point["lambdas"])
+    s = point["shift"]
+    sup.stress_windows = {k:[range(r.start+s, r.stop+s) for r in v] for k,v in sup.stress_windows.items()}
+    sim = Simulation(cells=cells, supervisor=sup)
+    field = sim.run(T=T, dt=1.0)
+    lam = point["lambdas"]
+    rows = []
+    for ev, series in field.type_time_series.items():
+        for t, v in sorted(series.items()):
+            rows.append([point["point_id"], point["replicate"], point["seed"], s,
+                         lam["hypoxia"], lam["oxidative"], lam["metabolic"], ev, t, v])
+    return point["point_id"], rows
+
+def _completed_points(out_csv, meta):
+    # A point counts as done only once it is listed in the manifest; drop any half-written rows.
+    # Only a CSV whose meta file matches this run is ever rewritten.
+    import csv
+    done_path, meta_path = out_csv + ".done", out_csv + ".meta.json"
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) != json.loads(json.dumps(meta)):
+                raise SystemExit(f"{meta_path} was written for different --steps/--seed; use a new --out")
+    elif os.path.exists(out_csv) or os.path.exists(done_path):
+        raise SystemExit(f"{out_csv} exists but has no {os.path.basename(meta_path)}; refusing to modify it, use a new --out")
+    else:
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        return set()
+    done = set()
+    if os.path.exists(done_path):
+        with open(done_path) as f:
+            done = {line.strip() for line in f if line.strip()}
+    if os.path.exists(out_csv):
+        tmp = out_csv + ".tmp"
+        with open(out_csv, newline="") as src, open(tmp, "w", newline="") as dst:
+            r, w = csv.reader(src), csv.writer(dst)
+            w.writerow(next(r, SWEEP_COLUMNS))
+            for row in r:
+                if row and row[0] in done:
+                    w.writerow(row)
+        os.replace(tmp, out_csv)
+    return done
+
+def run_sweep(lambda_grid, shift_grid, replicates=1, T=60, workers=None, base_seed=42, out_csv="outputs/sweep/sweep.csv"):
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    points = sweep_points(lambda_grid, shift_grid, replicates, base_seed)
+    done = _completed_points(out_csv, {"T":T, "base_seed":base_seed, "seeding":"sha256(seed:point_id)", "columns":SWEEP_COLUMNS})
+    todo = [p for p in points if p["point_id"] not in done]
+    print(f"Sweep: {len(points)} points, {len(done)} already done, {len(todo)} to run")
+    if not todo:
+        return out_csv
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(todo) // (workers * 4))
+    new_file = not os.path.exists(out_csv)
+    with open(out_csv, "a", newline="") as f, open(out_csv + ".done", "a") as mf, ProcessPoolExecutor(max_workers=workers) as pool:
+        w = csv.writer(f)
+        if new_file:
+            w.writerow(SWEEP_COLUMNS)
+        for n, (pid, rows) in enumerate(pool.map(partial(run_sweep_point, T=T), todo, chunksize=chunksize), 1):
+            w.writerows(rows)
+            f.flush()
+            mf.write(pid + "\n")
+            mf.flush()
+            if n % 100 == 0:
+                print(f"  {n}/{len(todo)} points")
+    print("Sweep complete →", out_csv)
+    return out_csv
+
+# Sensitivity inputs: (name, low, high). I/E are multipliers on the default profiles.
+SA_INPUTS = [("I_scale",0.5,1.5), ("E_scale",0.5,1.5), ("S",0.0,1.0), ("ghost",-1.0,1.0), ("fairy",0.0,1.0),
+             ("lambda_hypoxia",0.5,1.5), ("lambda_oxidative",0.5,1.5), ("lambda_metabolic",0.5,1.5)]
+
+def sa_output(x, T=60, seed=42):
+    # Scalar response: total EV release over the horizon, all EV types
+    import random
+    import numpy as np
+    from evelution.models.simulation import Simulation
+    random.seed(seed)
+    np.random.seed(seed)
+    p = dict(zip([n for n,_,_ in SA_INPUTS], x))
+    cells = make_cells()
+    for c in cells:
+        c.I = [min(1.0, max(0.0, v*p["I_scale"])) for v in c.I]
+        c.E = [min(1.0, max(0.0, v*p["E_scale"])) for v in c.E]
+        c.S, c.ghost, c.fairy = p["S"], p["ghost"], p["fairy"]
+    sup = make_supervisor()
+    sup.lambdas = {"hypoxia":p["lambda_hypoxia"], "oxidative":p["lambda_oxidative"], "metabolic":p["lambda_metabolic"]}
+    field = Simulation(cells=cells, supervisor=sup).run(T=T, dt=1.0)
+    return float(sum(sum(series.values()) for series in field.type_time_series.values()))
+
+def _sa_eval_task(task, T=60, seed=42):
+    key, x = task
+    return key, sa_output(x, T=T, seed=seed)
+
+def saltelli_design(n, seed=42):
+    """Rows keyed by j*(D+2)+k for base row j and block k (0=A, 1=B, 2+i=AB_i).
+
+    [A|B] is drawn row-major from one seeded stream, so growing n only appends rows
+    and keeps every previously evaluated key valid.
+    """
+    import numpy as np
+    lo = np.array([l for _,l,_ in SA_INPUTS]); hi = np.array([h for _,_,h in SA_INPUTS])
+    D = len(SA_INPUTS)
+    AB = lo + (hi-lo) * np.random.default_rng(seed).random((n, 2*D)).reshape(n, 2, D)
+    A, B = AB[:,0], AB[:,1]
+    X = np.empty((n, D+2, D))
+    X[:,0], X[:,1] = A, B
+    for i in range(D):
+        X[:,2+i] = A
+        X[:,2+i,i] = B[:,i]
+    return X.reshape(n*(D+2), D)
+
+def morris_design(r, levels=4, seed=42):
+    """r one-at-a-time trajectories of D+1 rows each, keyed by traj*(D+1)+step."""
+    import numpy as np
+    lo = np.array([l for _,l,_ in SA_INPUTS]); hi = np.array([h for _,_,h in SA_INPUTS])
+    D = len(SA_INPUTS)
+    delta = levels / (2.0*(levels-1))
+    grid = np.arange(levels // 2) / (levels-1)
+    X = np.empty((r, D+1, D))
+    for k in range(r):
+        rng = np.random.default_rng([seed, k])
+        x = rng.choice(grid, size=D)
+        X[k,0] = x
+        for s, i in enumerate(rng.permutation(D), 1):
+            x = x.copy()
+            x[i] += delta
+            X[k,s] = x
+    return (lo + (hi-lo) * X).reshape(r*(D+1), D)
+
+def sobol_indices(y, n, n_boot=200, seed=0):
+    import numpy as np
+    # Saltelli (2010) first-order and Jansen total-order estimators, bootstrap over base rows
+    D = len(SA_INPUTS)
+    Y = y.reshape(n, D+2)
+    fA, fB, fAB = Y[:,0], Y[:,1], Y[:,2:]
+    def est(idx):
+        a, b, ab = fA[idx], fB[idx], fAB[idx]
+        V = np.var(np.concatenate([a, b]))
+        if V <= 0:
+            return np.full(D, np.nan), np.full(D, np.nan)
+        return (b[:,None]*(ab - a[:,None])).mean(axis=0)/V, 0.5*((a[:,None] - ab)**2).mean(axis=0)/V
+    S1, ST = est(np.arange(n))
+    rng = np.random.default_rng(seed)
+    boots = [est(rng.integers(0, n, n)) for _ in range(n_boot)]
+    b1 = np.array([b[0] for b in boots]); bT = np.array([b[1] for b in boots])
+    out = {}
+    for i, (name,_,_) in enumerate(SA_INPUTS):
+        out[name] = {"S1": float(S1[i]), "S1_ci": [float(v) for v in np.nanpercentile(b1[:,i], [2.5, 97.5])],
+                     "ST": float(ST[i]), "ST_ci": [float(v) for v in np.nanpercentile(bT[:,i], [2.5, 97.5])]}
+    return out
+
+def morris_indices(X, y, r, n_boot=200, seed=0):
+    import numpy as np
+    D = len(SA_INPUTS)
+    lo = np.array([l for _,l,_ in SA_INPUTS]); hi = np.array([h for _,_,h in SA_INPUTS])
+    Xu = ((X - lo) / (hi - lo)).reshape(r, D+1, D)
+    Y = y.reshape(r, D+1)
+    dX = np.diff(Xu, axis=1)
+    moved = np.abs(dX).argmax(axis=2)
+    EE = np.empty((r, D))
+    rows = np.arange(r)[:,None]
+    EE[rows, moved] = np.diff(Y, axis=1) / dX[rows, np.arange(D)[None,:], moved]
+    rng = np.random.default_rng(seed)
+    boot = np.array([np.abs(EE[rng.integers(0, r, r)]).mean(axis=0) for _ in range(n_boot)])
+    out = {}
+    for i, (name,_,_) in enumerate(SA_INPUTS):
+        out[name] = {"mu": float(EE[:,i].mean()), "mu_star": float(np.abs(EE[:,i]).mean()),
+                     "mu_star_ci": [float(v) for v in np.percentile(boot[:,i], [2.5, 97.5])],
+                     "sigma": float(EE[:,i].std(ddof=1)) if r > 1 else 0.0}
+    return out
+
+def run_sensitivity(method="sobol", samples=256, T=60, workers=None, seed=42, n_boot=200, outdir="outputs/sensitivity"):
+    """Evaluate a Saltelli/Morris design on a process pool, checkpointing each row.
+
+    Evaluated rows are appended to {method}_evals.csv; re-running with a larger
+    --samples only evaluates the new rows.
+    """
+    import numpy as np
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    os.makedirs(outdir, exist_ok=True)
+    X = saltelli_design(samples, seed) if method=="sobol" else morris_design(samples, seed=seed)
+    meta = {"method":method, "inputs":SA_INPUTS, "T":T, "seed":seed}
+    meta_path = os.path.join(outdir, f"{method}_meta.json")
+    evals_path = os.path.join(outdir, f"{method}_evals.csv")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) != json.loads(json.dumps(meta)):
+                raise SystemExit(f"{meta_path} was written for different inputs/T/seed; use a new output directory")
+    else:
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        if os.path.exists(evals_path):
+            os.remove(evals_path)
+    y = np.full(len(X), np.nan)
+    if os.path.exists(evals_path):
+        with open(evals_path, newline="") as f:
+            for row in csv.reader(f):
+                # rows are key,value,key so a line cut short by an interrupted run is ignored
+                if len(row) == 3 and row[0] == row[2] and int(row[0]) < len(X):
+                    y[int(row[0])] = float(row[1])
+    todo = [(k, X[k].tolist()) for k in np.flatnonzero(np.isnan(y))]
+    print(f"Sensitivity ({method}): {len(X)} evaluations, {len(X)-len(todo)} checkpointed, {len(todo)} to run")
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(todo) // (workers * 4))
+        with open(evals_path, "a", newline="") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+            w = csv.writer(f)
+            for n, (k, v) in enumerate(pool.map(partial(_sa_eval_task, T=T, seed=seed), todo, chunksize=chunksize), 1):
+                y[k] = v
+                w.writerow([int(k), repr(v), int(k)])
+                if n % chunksize == 0:
+                    f.flush()
+    res = sobol_indices(y, samples, n_boot, seed) if method=="sobol" else morris_indices(X, y, samples, n_boot, seed)
+    out = os.path.join(outdir, f"{method}_indices.json")
+    with open(out, "w") as f:
+        json.dump({"method":method, "samples":samples, "evaluations":len(X), "T":T, "indices":res}, f, indent=2)
+    print("Sensitivity indices →", out)
+    return res
+
+# QC flag column → count key (same keys as the Streamlit import panel)
+QC_FLAGS = {"flag_outlier":"n_outliers", "flag_below_lod":"n_below_lod", "flag_below_loq":"n_below_loq"}
+
+def file_sha256(path, block=1<<20):
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _require_parquet():
+    # Checked once before the pool starts, so the dataset format never depends on the machine
+    import importlib.util
+    if not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        raise SystemExit("--mode import writes a Parquet dataset; install pyarrow (pip install pyarrow)")
+
+def _write_partition(df, base):
+    df.to_parquet(base + ".parquet", index=False)
+    return base + ".parquet"
+
+def import_one(task):
+    """Worker: hash, parse, QC-count and write one instrument file as a dataset partition."""
+    path, kind, known_hash, outdir = task
+    digest = file_sha256(path)
+    if digest == known_hash:
+        return {"path":path, "sha256":digest, "skipped":True}
+    from evelution.data.instruments import parse_nta_csv, parse_trps_csv, parse_flow_csv
+    parse = {"nta":parse_nta_csv, "trps":parse_trps_csv, "flow":parse_flow_csv}[kind]
+    df = parse(path)
+    df["source_file"] = os.path.basename(path)
+    qc = {"rows": int(df.shape[0])}
+    for flag, key in QC_FLAGS.items():
+        qc[key] = int(df[flag].sum()) if flag in df.columns else 0
+    # path hash + content hash: identical files at two paths never share a partition
+    import hashlib
+    src = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+    part = _write_partition(df, os.path.join(outdir, f"part-{src}-{digest[:16]}"))
+    return {"path":path, "sha256":digest, "skipped":False, "partition":os.path.basename(part), "qc":qc}
+
+def run_batch_import(kind, pattern, outroot="outputs/imports", workers=None):
+    """Import a file, directory or glob of instrument CSVs into one partitioned dataset per kind.
+
+    Files whose content hash matches the last import are skipped. A file that fails to
+    parse is recorded with its error and retried next time; the rest of the batch goes on.
+    The manifest and QC totals are rewritten as each file finishes.
+    """
+    import glob
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    if os.path.isdir(pattern):
+        paths = sorted(glob.glob(os.path.join(pattern, "**", "*.csv"), recursive=True))
+    else:
+        paths = sorted(glob.glob(pattern, recursive=True))
+    _require_parquet()
+    outdir = os.path.join(outroot, kind)
+    os.makedirs(outdir, exist_ok=True)
+    manifest_path = os.path.join(outdir, "_manifest.json")
+    legacy = os.path.join(outdir, "manifest.json")
+    manifest = {}
+    for path in (manifest_path, legacy):
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            break
+    for name in ("manifest.json", "qc.json"):
+        # older imports kept these unprefixed, which broke reading the folder as a dataset
+        if os.path.exists(os.path.join(outdir, name)):
+            os.remove(os.path.join(outdir, name))
+    tasks = []
+    for p in paths:
+        prev = manifest.get(os.path.abspath(p), {})
+        part = prev.get("partition")
+        ok = part and part.endswith(".parquet") and os.path.exists(os.path.join(outdir, part))
+        known = prev.get("sha256") if ok else None
+        tasks.append((p, kind, known, outdir))
+    n_new = n_skip = n_err = 0
+    qc = _write_import_state(outdir, kind, manifest)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(import_one, t): t[0] for t in tasks}
+        for fut in as_completed(futures):
+            path = futures[fut]
+            key = os.path.abspath(path)
+            try:
+                res = fut.result()
+            except Exception as e:
+                res = {"error": f"{type(e).__name__}: {e}"}
+            if res.get("skipped"):
+                n_skip += 1
+                continue
+            old = manifest.get(key, {}).get("partition")
+            if old and old != res.get("partition") and os.path.exists(os.path.join(outdir, old)):
+                os.remove(os.path.join(outdir, old))
+            if "error" in res:
+                manifest[key] = {"error": res["error"]}
+                n_err += 1
+                print(f"  FAILED {path}: {res['error']}")
+            else:
+                manifest[key] = {"sha256":res["sha256"], "partition":res["partition"], "qc":res["qc"]}
+                n_new += 1
+                print(f"  imported {path} ({res['qc']['rows']} rows)")
+            qc = _write_import_state(outdir, kind, manifest)
+    print(f"Import ({kind}): {n_new} new/changed, {n_skip} unchanged, {n_err} failed → {outdir}")
+    return qc
+
+def _write_import_state(outdir, kind, manifest):
+    # _manifest.json + _qc.json, each replaced atomically so an interrupted batch leaves a valid
+    # pair; the "_" prefix (and ".tmp" staging under it) keeps Arrow from reading them as data
+    qc = {"files": sum(1 for e in manifest.values() if "partition" in e), "instrument_types": [kind],
+          "errors": {p: e["error"] for p, e in manifest.items() if "error" in e}}
+    for entry in manifest.values():
+        for k, v in entry.get("qc", {}).items():
+            qc[k] = qc.get(k, 0) + v
+    for name, data in (("_manifest.json", manifest), ("_qc.json", qc)):
+        path = os.path.join(outdir, name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(path + ".tmp", path)
+    return qc
+
+LAB_KEY_COLUMNS = ("timestep","cell_id","EV_type")
+
+class LabKineticsIndex:
+    """Single-pass (timestep, EV_type) aggregates of a lab CSV.
+
+    Reads the file in chunks and keeps only running sums/counts per group, so memory
+    scales with the number of groups rather than rows; mean queries are dict lookups.
+    """
+    def __init__(self, timesteps, groups, columns, sums, counts, protein_keys):
+        import numpy as np
+        self.timesteps = timesteps
+        self.columns = columns
+        self._row = {g:i for i,g in enumerate(groups)}
+        self._col = {c:j for j,c in enumerate(columns)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        self.counts = counts
+        self._protein_keys = protein_keys
+
+    @classmethod
+    def from_csv(cls, path, chunk_rows=500_000):
+        import numpy as np
+        import pandas as pd
+        sums = counts = None
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            value_cols = [c for c in chunk.columns if c not in LAB_KEY_COLUMNS]
+            chunk[value_cols] = chunk[value_cols].apply(pd.to_numeric, errors="coerce")
+            g = chunk.groupby(["timestep","EV_type"], sort=False)[value_cols]
+            s, n = g.sum(min_count=1).fillna(0.0), g.count()
+            sums = s if sums is None else sums.add(s, fill_value=0.0)
+            counts = n if counts is None else counts.add(n, fill_value=0)
+        if sums is None:
+            return cls([], [], [], np.zeros((0,0)), np.zeros((0,0)), {})
+        sums = sums.fillna(0.0).sort_index()
+        counts = counts.reindex(index=sums.index, columns=sums.columns).fillna(0)
+        columns = list(sums.columns)
+        groups = [(int(t), str(ev)) for t, ev in sums.index]
+        prot_cols = [c for c in columns if c != "EV_rate"]
+        protein_keys = {}
+        for ev, block in counts[prot_cols].groupby(level="EV_type"):
+            protein_keys[str(ev)] = [c for c in prot_cols if block[c].sum() > 0]
+        timesteps = sorted({t for t,_ in groups})
+        return cls(timesteps, groups, columns, sums.to_numpy(float), counts.to_numpy(float), protein_keys)
+
+    def _mean(self, t, ev, col):
+        i, j = self._row.get((t, ev)), self._col.get(col)
+        if i is None or j is None or self.counts[i, j] == 0:
+            return 0.0
+        return float(self.means[i, j])
+
+    def mean_rate(self, t, ev):
+        return self._mean(t, ev, "EV_rate")
+
+    def mean_protein(self, t, ev, k):
+        return self._mean(t, ev, k)
+
+    def protein_keys(self, ev):
+        return list(self._protein_keys.get(ev, []))
+
+    def _lookup(self, ev_types, columns, timesteps):
+        import numpy as np
+        # -1 indexes the padding row/column appended by the callers
+        rows = np.array([[self._row.get((t, ev), -1) for t in timesteps] for ev in ev_types], dtype=np.intp).reshape(len(ev_types), len(timesteps))
+        cols = np.array([self._col.get(c, -1) for c in columns], dtype=np.intp)
+        return rows[:, None, :], cols[None, :, None]
+
+    def aligned(self, ev_types, columns, timesteps=None):
+        """Mean values as an (EV type × column × timestep) array; unobserved cells are NaN."""
+        import numpy as np
+        ts = self.timesteps if timesteps is None else timesteps
+        r, c = self._lookup(ev_types, columns, ts)
+        return np.pad(self.means, ((0,1),(0,1)), constant_values=np.nan)[r, c]
+
+    def observed(self, ev_types, columns):
+        """(EV type × column) mask of pairs with at least one lab measurement."""
+        import numpy as np
+        r, c = self._lookup(ev_types, columns, self.timesteps)
+        return np.pad(self.counts, ((0,1),(0,1)))[r, c].sum(axis=-1) > 0
+
+def field_arrays(field, ev_types, prot_keys, timesteps):
+    """Simulated EV_rate + proteins as an (EV type × (1+K) × timestep) array, read once from the field."""
+    import numpy as np
+    out = np.zeros((len(ev_types), 1+len(prot_keys), len(timesteps)))
+    for e, ev in enumerate(ev_types):
+        rates = field.type_time_series.get(ev, {})
+        out[e,0] = [rates.get(t, 0.0) for t in timesteps]
+        prot = field.protein_time_series.get(ev, {})
+        for j, k in enumerate(prot_keys):
+            series = prot.get(k)
+            if series:
+                out[e,1+j] = [series.get(t, 0.0) for t in timesteps]
+    return out
+
+def comparison_metrics(sim_arr, lab_arr):
+    """Observed-point count n, RMSE, MAE, bias and Pearson r along the last (time) axis.
+
+    Only timesteps where `lab_arr` is not NaN are scored; pairs with n == 0 get NaN.
+    """
+    import numpy as np
+    mask = ~np.isnan(lab_arr)
+    n = mask.sum(axis=-1)
+    diff = np.where(mask, sim_arr - lab_arr, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sim_mean = np.where(mask, sim_arr, 0.0).sum(axis=-1, keepdims=True) / n[..., None]
+        lab_mean = np.where(mask, lab_arr, 0.0).sum(axis=-1, keepdims=True) / n[..., None]
+        sc = np.where(mask, sim_arr - sim_mean, 0.0)
+        lc = np.where(mask, lab_arr - lab_mean, 0.0)
+        denom = np.sqrt((sc*sc).sum(axis=-1) * (lc*lc).sum(axis=-1))
+        r = np.where(denom > 0, (sc*lc).sum(axis=-1) / denom, np.nan)
+        return {
+            "n": n,
+            "rmse": np.sqrt((diff*diff).sum(axis=-1) / n),
+            "mae": np.abs(diff).sum(axis=-1) / n,
+            "bias": diff.sum(axis=-1) / n,
+            "r": r,
+        }
+
+def export_batch_comparison(outdir, ev_types, timesteps, targets, sim_arr, lab_arr, observed):
+    import numpy as np
+    # One consolidated metrics table + one long aligned table for every observed (EV type, target) pair
+    import pandas as pd
+    m = comparison_metrics(sim_arr, lab_arr)
+    e_idx, c_idx = np.nonzero(observed)
+    ev_col = np.asarray(ev_types, dtype=object)[e_idx]
+    tgt_col = np.asarray(targets, dtype=object)[c_idx]
+    metrics = pd.DataFrame({"EV_type": ev_col, "target": tgt_col, **{k: v[e_idx, c_idx] for k, v in m.items()}})
+    metrics_path = os.path.join(outdir, "metrics_all.csv")
+    metrics.to_csv(metrics_path, index=False)
+    T = len(timesteps)
+    aligned = pd.DataFrame({"EV_type": np.repeat(ev_col, T), "target": np.repeat(tgt_col, T),
+                            "timestep": np.tile(np.asarray(timesteps), len(e_idx)),
+                            "sim": sim_arr[e_idx, c_idx].ravel(), "lab": lab_arr[e_idx, c_idx].ravel()})
+    aligned = aligned[aligned["lab"].notna()]
+    aligned.to_csv(os.path.join(outdir, "aligned_all.csv"), index=False)
+    return metrics_path
+
+# --- CLI: modes and flag actions ------------------------------------------------------
+# Each handler imports what it uses, so dispatching to one never pays for the others.
+
+def make_cache(args):
+    return None if args.no_cache else RunCache(args.cache_dir, args.cache_max_mb*2**20)
+
+def mode_basic(args):
+    sim, _, cfg = run_basic(cache=make_cache(args))
+    explain_one(sim)
+    make_permalink(sim, cfg)
+
+def mode_story(args):
+    sim = run_story_mode()
+    explain_one(sim)
+    make_permalink(sim, mode="story")
+
+def mode_explain(args):
+    sim, _, _ = run_basic(cache=make_cache(args))
+    explain_one(sim)
+
+def mode_multi(args):
+    emit_repro("multi")
+    sim = run_multiagent()
+    explain_one(sim)
+    make_permalink(sim, mode="multi")
+
+def mode_compare(args):
+    emit_repro("compare")
     # Load lab data CSV, run sim on matching timeline, export overlays/metrics
-    from evelution.data.labdata import LabKinetics
+    import numpy as np
+    from evelution.models.simulation import Simulation
     from evelution.analysis.compare import export_comparison
-    from evelution.ui.snapshot import save_state
     if not args.lab:
         print("Please provide --lab path to a CSV with columns: timestep,cell_id,EV_type,EV_rate,(proteins...)")
     else:
-        lab = LabKinetics.from_csv(args.lab)
+        with phase("LabKineticsIndex.from_csv"):
+            lab = LabKineticsIndex.from_csv(args.lab)
         cells = make_cells()
         sup = make_supervisor()
         sim = Simulation(cells=cells, supervisor=sup)
         # Run sim for max timestep in lab
         T = (max(lab.timesteps)+1) if lab.timesteps else 60
-        field = sim.run(T=T, dt=1.0)
+        field, _ = cached_run(sim, run_config(cells, sup, T), make_cache(args), [])
         # Aggregate sim rates/proteins by timestep for each EV type
         outdir = "outputs/compare"
         os.makedirs(outdir, exist_ok=True)
         ev_types = list(sim.EV_TYPES)
-        for ev in ev_types:
-            sim_rates = {t: field.type_time_series.get(ev, {}).get(t, 0.0) for t in lab.timesteps}
-            lab_rates = {t: lab.mean_rate(t, ev) for t in lab.timesteps}
-            # proteins: union seen in lab for this EV
-            prot_keys = set()
-            for t in lab.timesteps:
-                d = lab.proteins.get((t, cells[0].cell_id, ev), {})
-                prot_keys.update(d.keys())
-            prot_keys = sorted(list(prot_keys))[:8]  # limit for demo
-            sim_prot = {k: {t: field.protein_time_series.get(ev,{}).get(k,{}).get(t, 0.0) for t in lab.timesteps} for k in prot_keys}
-            lab_prot = {k: {t: lab.mean_protein(t, ev, k) for t in lab.timesteps} for k in prot_keys}
-            export_comparison(outdir, ev, lab.timesteps, sim_rates, lab_rates, prot_keys, sim_prot, lab_prot)
+        # proteins: union seen in lab across all EV types; align sim and lab once
+        prot_keys = sorted(set().union(*(lab.protein_keys(ev) for ev in ev_types)))
+        targets = ["EV_rate"] + prot_keys
+        with phase("batch_comparison", targets=len(targets)):
+            sim_arr = field_arrays(field, ev_types, prot_keys, lab.timesteps)
+            lab_arr = lab.aligned(ev_types, targets)
+            export_batch_comparison(outdir, ev_types, lab.timesteps, targets, sim_arr, lab_arr, lab.observed(ev_types, targets))
+        # per-EV rate overlays; proteins are in aligned_all.csv / metrics_all.csv
+        for e, ev in enumerate(ev_types):
+            seen = ~np.isnan(lab_arr[e,0])
+            ts = [t for t, ok in zip(lab.timesteps, seen) if ok]
+            if not ts:
+                continue  # EV type never measured in the lab file
+            sim_rates = dict(zip(ts, sim_arr[e,0][seen].tolist()))
+            lab_rates = dict(zip(ts, lab_arr[e,0][seen].tolist()))
+            export_comparison(outdir, ev, ts, sim_rates, lab_rates, [], {}, {})
         # Save a pair of snapshots for diffing if user runs story/basic beforehand
         with open(os.path.join(outdir, "lab_summary.json"), "w") as f:
-            import json; json.dump({"timesteps": lab.timesteps, "ev_types": ev_types}, f, indent=2)
+            json.dump({"timesteps": lab.timesteps, "ev_types": ev_types}, f, indent=2)
         print("Comparison artifacts written to outputs/compare/")
 
-
-
-elif args.mode=="game":
-        emit_repro("game")
+def mode_game(args):
+    emit_repro("game")
     # 1) Export tutorial
     from evelution.ui.tutorial import export_script
     tut_path = export_script()
@@ -227,52 +1003,168 @@ elif args.mode=="game":
         print("Photo mode exported:", export_scene_example())
     print("Game scaffolds ready. See outputs/ for artifacts.")
 
+def mode_sweep(args):
+    lambda_grid = [float(x) for x in args.lambda_grid.split(",") if x.strip()]
+    shift_grid = [int(x) for x in args.shift_grid.split(",") if x.strip()]
+    run_sweep(lambda_grid, shift_grid, replicates=args.replicates, T=args.steps,
+              workers=args.workers or None, base_seed=args.seed, out_csv=args.out)
 
-    if args.theme:
-        emit_repro("theme")
-        from evelution.ui.demo_theme import export_demo
-        demo = export_demo(args.theme)
-        print("Theme exported:", demo)
-    
+def mode_import(args):
+    if not args.path:
+        print("Please provide --path to a CSV file, a directory, or a glob (e.g. 'runs/2025-*/*.csv')")
+    else:
+        run_batch_import(args.import_kind, args.path, workers=args.workers or None)
 
-# Trainer register
-if args.register_trainer and args.trainer_id and args.trainer_pass:
+def mode_sensitivity(args):
+    run_sensitivity(args.sa_method, samples=args.samples, T=args.steps, workers=args.workers or None,
+                    seed=args.seed, n_boot=args.n_boot)
+
+MODES = {
+    "basic": mode_basic, "story": mode_story, "explain": mode_explain, "multi": mode_multi,
+    "teach": None, "compare": mode_compare, "game": mode_game, "sweep": mode_sweep,
+    "sensitivity": mode_sensitivity, "import": mode_import,
+}
+
+def action_theme(args):
+    emit_repro("theme")
+    from evelution.ui.demo_theme import export_demo
+    demo = export_demo(args.theme)
+    print("Theme exported:", demo)
+
+def action_register_trainer(args):
     from evelution.security.auth import register_trainer
     path = register_trainer(args.trainer_id, args.trainer_pass, name="Trainer "+args.trainer_id)
     print("Registered trainer at:", path)
 
-
-
-# Plugin ops
-if args.list_plugins and args.trainer_id:
+def action_list_plugins(args):
     from evelution.influence.registry import list_plugins
     print("Plugins:", list_plugins(args.trainer_id))
-if args.add_plugin and args.trainer_id and args.trainer_pass:
+
+def action_add_plugin(args):
     from evelution.influence.registry import install_plugin
     dst = install_plugin(args.trainer_id, args.trainer_pass, args.add_plugin)
     print("Plugin installed at:", dst)
 
-
-if args.register_student and args.user_id is not None:
+def action_register_student(args):
     from evelution.security.auth import register_student
     p = register_student(args.user_id, args.user_pass, name=f"Student {args.user_id}")
     print("Registered student at:", p)
 
-
-
-# Notes ops
-if args.note_new and args.user_id:
+def action_note_new(args):
     from evelution.notes.notes import create_note
     note = create_note(args.role, args.user_id, args.note_new, args.note_text, password=args.user_pass)
     print("Note saved with id:", note["id"])
-if args.note_list and args.user_id:
+
+def action_note_list(args):
     from evelution.notes.notes import list_notes
     notes = list_notes(args.role, args.user_id)
     print("Notes:", [ (n["id"], n["title"]) for n in notes ])
-if args.note_export and args.user_id:
+
+def action_note_export(args):
     from evelution.notes.notes import export_note
     path = export_note(args.role, args.user_id, args.note_export, args.note_format)
     print("Exported note →", path)
 
+def action_rehydrate(args):
+    token = args.permalink
+    if os.path.exists(token):
+        with open(token) as f:
+            token = f.read().strip()
+    cfg, hit = rehydrate_permalink(token, RunCache(args.cache_dir, args.cache_max_mb*2**20))
+    if cfg.get("mode", "basic") not in REHYDRATABLE:
+        print(f"This permalink is from a --mode {cfg['mode']} run; those runs are not cached, so there is nothing to rehydrate.")
+        return
+    if hit is None:
+        print("No cached run for this permalink: it was evicted, cached under another --cache_dir, or made by a "
+              "different engine version. Re-running --mode basic with this config repopulates the cache.")
+        return
+    field, meta = hit
+    outdir = "outputs/permalink_run"
+    os.makedirs(outdir, exist_ok=True)
+    field.export_time_series_csv(os.path.join(outdir, "ev_time_series.csv"))
+    with open(os.path.join(outdir, "run.json"), "w") as f:
+        json.dump({k: meta[k] for k in ("key","engine","created","config","metrics")}, f, indent=2)
+    print(f"Rehydrated cached run {meta['key'][:12]} → {outdir}/")
+
+# (when, handler) — run in this order after the mode
+ACTIONS = [
+    (lambda a: a.theme, action_theme),
+    (lambda a: a.register_trainer and a.trainer_id and a.trainer_pass, action_register_trainer),
+    (lambda a: a.list_plugins and a.trainer_id, action_list_plugins),
+    (lambda a: a.add_plugin and a.trainer_id and a.trainer_pass, action_add_plugin),
+    (lambda a: a.register_student and a.user_id is not None, action_register_student),
+    (lambda a: a.note_new and a.user_id, action_note_new),
+    (lambda a: a.note_list and a.user_id, action_note_list),
+    (lambda a: a.note_export and a.user_id, action_note_export),
+    (lambda a: a.permalink, action_rehydrate),
+]
+
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=list(MODES), default=None,
+                        help="defaults to basic unless only account/notes/plugin/theme flags are given")
+    parser.add_argument("--lab", type=str, default="")
+    parser.add_argument("--tutorial", action="store_true")
+    parser.add_argument("--photo", action="store_true")
+    parser.add_argument("--theme", type=str, default="")
+    parser.add_argument("--trainer_id", type=str, default="")
+    parser.add_argument("--trainer_pass", type=str, default="")
+    parser.add_argument("--register_trainer", action="store_true")
+    parser.add_argument("--dump_lessons", action="store_true")
+    parser.add_argument("--edit_lessons", type=str, default="")
+    parser.add_argument("--add_plugin", type=str, default="")
+    parser.add_argument("--list_plugins", action="store_true")
+    parser.add_argument("--role", type=str, default="student", choices=["student","trainer"])
+    parser.add_argument("--user_id", type=str, default="")
+    parser.add_argument("--user_pass", type=str, default="")
+    parser.add_argument("--register_student", action="store_true")
+    parser.add_argument("--note_new", type=str, default="")
+    parser.add_argument("--note_text", type=str, default="")
+    parser.add_argument("--note_list", action="store_true")
+    parser.add_argument("--note_export", type=str, default="")
+    parser.add_argument("--note_format", type=str, default="txt")
+    parser.add_argument("--var", type=str, default="E_O2")
+    parser.add_argument("--cell_id", type=str, default="C1")
+    parser.add_argument("--import_kind", type=str, default="nta", choices=["nta","trps","flow"])
+    parser.add_argument("--path", type=str, default="")
+    parser.add_argument("--meta", type=str, default="")
+    parser.add_argument("--figA", type=str, default="")
+    parser.add_argument("--figB", type=str, default="")
+    parser.add_argument("--lambda_grid", type=str, default="0.8,1.0,1.2")
+    parser.add_argument("--shift_grid", type=str, default="0")
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default="outputs/sweep/sweep.csv")
+    parser.add_argument("--sa_method", type=str, default="sobol", choices=["sobol","morris"])
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--n_boot", type=int, default=200)
+    parser.add_argument("--profile", action="store_true", help="write run timings, per-module self-time + Chrome trace to outputs/profile/")
+    parser.add_argument("--profile_memory", action="store_true", help="--profile plus tracemalloc peak (slows the run; rates are skewed)")
+    parser.add_argument("--no_cache", action="store_true", help="always recompute instead of using the run cache")
+    parser.add_argument("--cache_dir", type=str, default="outputs/cache")
+    parser.add_argument("--cache_max_mb", type=int, default=512)
+    parser.add_argument("--permalink", type=str, default="", help="token (or file with one) to rehydrate from the run cache")
+    return parser
+
+def main(argv=None):
+    global PROFILER
+    args = build_parser().parse_args(argv)
+    actions = [fn for when, fn in ACTIONS if when(args)]
+    if args.mode is None and not actions:
+        args.mode = "basic"
+    if args.profile or args.profile_memory:
+        PROFILER = RunProfiler(args.mode or "actions", memory=args.profile_memory)
+    try:
+        handler = MODES.get(args.mode)
+        if handler is not None:
+            handler(args)
+        for fn in actions:
+            fn(args)
+    finally:
+        if PROFILER is not None:
+            PROFILER.finish()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,32 @@
+"""Demo population shared by the CLI, the Streamlit sandbox worker and the benchmarks.
+
+Model classes are imported inside each builder, so importing this module stays cheap.
+"""
+
+def make_cells(n=3):
+    from evelution.models.cell import CellAgent
+    cells = []
+    for i in range(n):
+        c = CellAgent(
+            cell_id=f"C{i+1}",
+            cell_type="generic",
+            I=[0.6,0.5,0.4,0.5,0.6],
+            E=[0.5,0.5,0.5,0.5,0.5],
+            ghost=0.0,
+            fairy=0.3,
+            S=0.6,
+            P={"CD9":0.6,"CD63":0.5,"CD81":0.55,"TSG101":0.4,"ALIX":0.45},
+        )
+        cells.append(c)
+    return cells
+
+def make_supervisor():
+    from evelution.models.supervisor import Supervisor
+    sup = Supervisor()
+    sup.stress_windows = {"hypoxia":[range(10,20)], "oxidative":[range(30,40)]}
+    sup.lambdas = {"hypoxia":1.2,"oxidative":0.9,"metabolic":0.85}
+    return sup
+
+def make_exchange():
+    from evelution.multiagent.eco import EVExchangeGraph, ExchangeEdge
+    return EVExchangeGraph(edges=[ExchangeEdge("C1","C2",0.2), ExchangeEdge("C2","C3",0.1)])
@@ -1,6 +1,9 @@
 
-import io, json, os, numpy as np, pandas as pd, matplotlib.pyplot as plt
+import io, json, os, queue, time, numpy as np, pandas as pd, matplotlib.pyplot as plt
+import multiprocessing as mp
+import weakref
 import streamlit as st
+from matplotlib.collections import LineCollection
 
 # Reuse bundle code
 from evelution.calibration.mappings import load_mapping, LinearMap, LogisticMap, PHMap
@@ -8,11 +11,33 @@ from evelution.export.methods import export_methods_md
 from evelution.data.instruments import parse_nta_csv, parse_trps_csv, parse_flow_csv, export_standard
 from evelution.compliance.evtrack import score as evtrack_score
 from evelution.physics.electrostatics import delta_pKa_from_surface_potential, fraction_protonated, debye_length_nm
+from live_worker import stream_simulation
 
 st.set_page_config(page_title="EVelution — Micelle Genesis", layout="wide")
+
+# --- Caching helpers: every widget change re-runs this script, so anything that only
+# depends on its inputs is memoized on them (figures as PNG bytes, files on path+mtime).
+# st.fragment (newer Streamlit) lets a panel re-run on its own widgets without the rest.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+@st.cache_data(show_spinner=False)
+def read_text(path, mtime):
+    with open(path, "r") as f:
+        return f.read()
+
+def fig_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=fig.dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
 theme_choice = st.sidebar.selectbox('Theme', ['Minimal','Classic'], index=0)
 if theme_choice=='Minimal':
-    st.markdown(open('content/themes/minimal.css','r').read(), unsafe_allow_html=True)
+    css_path = 'content/themes/minimal.css'
+    st.markdown(read_text(css_path, _mtime(css_path)), unsafe_allow_html=True)
 
 # --- Styling (simple, inline CSS) ---
 st.markdown('''
@@ -70,43 +95,55 @@ def draw_micelle(ax, center=(0,0), radius=1.0, heads=28, psi_mV=-40):
     y = center[1] + radius*np.sin(theta)
     # heads
     ax.scatter(x, y, s=30, edgecolors=c, facecolors="white", linewidths=1.5, zorder=3)
-    # tails (inward lines)
-    for xi, yi, th in zip(x, y, theta):
-        ax.plot([xi, center[0]+0.25*np.cos(th)], [yi, center[1]+0.25*np.sin(th)], color=c, lw=1.2, alpha=0.9, zorder=2)
+    # tails (inward lines), one LineCollection instead of an ax.plot per tail
+    tails = np.stack([np.column_stack([x, y]),
+                      np.column_stack([center[0]+0.25*np.cos(theta), center[1]+0.25*np.sin(theta)])], axis=1)
+    ax.add_collection(LineCollection(tails, colors=c, linewidths=1.2, alpha=0.9, zorder=2))
     # outline
     circ = plt.Circle(center, radius, fill=False, color=c, lw=1.0, alpha=0.7)
     ax.add_artist(circ)
 
-with colB:
+@st.cache_data(show_spinner=False, max_entries=16)
+def render_micelles(regime, negative):
+    # The picture only depends on the regime (monomers / one micelle / with satellites) and the sign of Ψ
+    psi = -1 if negative else 1
     fig, ax = plt.subplots(figsize=(6.2,4.0), dpi=200)
     ax.set_aspect('equal')
     ax.axis("off")
-    if conc <= cmc + 1e-9:
+    if regime == "monomers":
         # monomers scattered
         rng = np.random.default_rng(42)
         pts = rng.uniform(-2.6, 2.6, size=(80,2))
-        color = "#5B8DEF" if psi_mV<=0 else "#C26DFF"
+        color = "#5B8DEF" if negative else "#C26DFF"
         ax.scatter(pts[:,0], pts[:,1], s=18, edgecolors=color, facecolors="white", linewidths=1.2, alpha=0.9)
         ax.text(-2.6, 2.6, "Below CMC → monomers", fontsize=10, color="#334155")
     else:
         # one primary micelle, optionally a couple satellites
-        draw_micelle(ax, (0,0), 1.5, heads=36, psi_mV=psi_mV)
-        if conc > 1.5*cmc:
-            draw_micelle(ax, (2.3,1.2), 0.9, heads=20, psi_mV=psi_mV)
-            draw_micelle(ax, (-2.1,-1.4), 0.8, heads=18, psi_mV=psi_mV)
+        draw_micelle(ax, (0,0), 1.5, heads=36, psi_mV=psi)
+        if regime == "satellites":
+            draw_micelle(ax, (2.3,1.2), 0.9, heads=20, psi_mV=psi)
+            draw_micelle(ax, (-2.1,-1.4), 0.8, heads=18, psi_mV=psi)
         ax.text(-2.6, 2.6, "Above CMC → micelles", fontsize=10, color="#334155")
-    st.pyplot(fig, clear_figure=True)
+    return fig_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def titration_frame(pKa_bulk, pKa_app):
+    # Two 400-point curves as data, drawn client-side: pKa_app moves with every Ψ/z/pKa
+    # value, so a matplotlib PNG here would be re-rendered on almost every slide
+    pH = pd.Index(np.linspace(3, 11, 400), name="pH")
+    return pd.DataFrame({"bulk": 1.0/(1.0 + 10**(pH - pKa_bulk)),
+                         "near Ψ surface": 1.0/(1.0 + 10**(pH - pKa_app))}, index=pH)
+
+with colB:
+    if conc <= cmc + 1e-9:
+        regime = "monomers"
+    else:
+        regime = "satellites" if conc > 1.5*cmc else "micelle"
+    st.image(render_micelles(regime, psi_mV<=0))
 
     # Titration curves
-    pH = np.linspace(3, 11, 400)
-    frac_bulk = 1.0/(1.0 + 10**(pH - pKa_bulk))
-    frac_app  = 1.0/(1.0 + 10**(pH - pKa_app))
-    fig2, ax2 = plt.subplots(figsize=(6.2,2.6), dpi=200)
-    ax2.plot(pH, frac_bulk, label="bulk", lw=2)
-    ax2.plot(pH, frac_app,  label="near Ψ surface", lw=2)
-    ax2.set_xlabel("pH"); ax2.set_ylabel("fraction protonated")
-    ax2.legend(frameon=False)
-    st.pyplot(fig2, clear_figure=True)
+    st.caption("Fraction protonated vs pH")
+    st.line_chart(titration_frame(round(float(pKa_bulk), 3), round(float(pKa_app), 3)), height=220)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -118,10 +155,14 @@ if not st.session_state.entered:
 st.header("Sandbox — Calibrated Story & Explain‑Why")
 c1, c2, c3, c4 = st.columns(4)
 
+@st.cache_resource(show_spinner=False)
+def _load_mapping(p, mtime):
+    return load_mapping(p)
+
 def load_or_default(var, unit, xmin, xmax, invert=False):
     p = f"content/calibrations/{user_id}/{var}.json"
     if os.path.exists(p):
-        return load_mapping(p)
+        return _load_mapping(p, _mtime(p))
     return LinearMap(unit=unit, xmin=xmin, xmax=xmax, invert=invert)
 
 m_o2   = load_or_default("E_O2", "%O2", 0.0, 21.0)
@@ -147,16 +188,19 @@ with c4:
     st.caption(f"map: {m_escrt.__class__.__name__}")
 
 # Explain-Why chart (demo)
-gS = 1.0/(1.0 + np.exp(-6*(n_es-0.5)))
-gW = 0.6*n_atp + 0.4*(1.0-n_ros)
-stress = 1.0 + 0.25*(0.5 - n_o2)
-parts = {"log g_S": np.log(gS+1e-9), "log g_W": np.log(gW+1e-9), "log λ(O2)": np.log(stress+1e-9)}
-
-figE, axE = plt.subplots(figsize=(4,2.5), dpi=200)
-axE.bar(list(parts.keys()), list(parts.values()))
-axE.set_ylabel("log contribution")
-axE.set_title("Explain‑Why: log r = log r_T + log g_S + log g_W + Σ log λ_s")
-st.pyplot(figE, clear_figure=True)
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_explain(n_es, n_atp, n_ros, n_o2):
+    gS = 1.0/(1.0 + np.exp(-6*(n_es-0.5)))
+    gW = 0.6*n_atp + 0.4*(1.0-n_ros)
+    stress = 1.0 + 0.25*(0.5 - n_o2)
+    parts = {"log g_S": np.log(gS+1e-9), "log g_W": np.log(gW+1e-9), "log λ(O2)": np.log(stress+1e-9)}
+    figE, axE = plt.subplots(figsize=(4,2.5), dpi=200)
+    axE.bar(list(parts.keys()), list(parts.values()))
+    axE.set_ylabel("log contribution")
+    axE.set_title("Explain‑Why: log r = log r_T + log g_S + log g_W + Σ log λ_s")
+    return fig_png(figE)
+
+st.image(render_explain(float(n_es), float(n_atp), float(n_ros), float(n_o2)))
 
 with st.expander("Exact mappings used"):
     st.write(f"O2 → {m_o2.__class__.__name__}")
@@ -166,54 +210,123 @@ with st.expander("Exact mappings used"):
 
 st.divider()
 
-# ----------- Shared environment demo -----------
-st.subheader("Shared environment (demo)")
-t = np.arange(0, 10, 1.0)
-flux = {"CellA": np.sin(t/3)+1.5, "CellB": np.cos(t/4)+1.2, "CellC": 0.4+0*t}
-fig2, ax2 = plt.subplots(figsize=(6,3), dpi=200)
-ax2.stackplot(t, np.row_stack([flux[k] for k in flux.keys()]), labels=list(flux.keys()))
-ax2.legend(fontsize=8, ncol=3, frameon=False)
-ax2.set_xlabel("time"); ax2.set_ylabel("EV flux")
-st.pyplot(fig2, clear_figure=True)
-
-# ----------- Per-cell A/B/C dashboard -----------
-st.subheader("Per‑cell snapshot compare (demo)")
-t = np.arange(0, 12, 1.0)
-A = {"time":t, "rate":0.5+0.1*np.sin(t), "W":0.6+0.1*np.cos(t/2), "S":0.5+0.05*np.sin(t/3)}
-B = {"time":t, "rate":0.7+0.1*np.sin(t+0.2), "W":0.65+0.1*np.cos(t/2), "S":0.55+0.05*np.sin(t/3)}
-C = {"time":t, "rate":0.4+0.1*np.sin(t-0.1), "W":0.5+0.1*np.cos(t/2), "S":0.45+0.05*np.sin(t/3)}
-
-fig3, (ax31, ax32) = plt.subplots(nrows=2, figsize=(6,5), dpi=200)
-for k, snap in {"A":A,"B":B,"C":C}.items():
-    ax31.plot(snap["time"], snap["rate"], label=f"{k} rate")
-ax31.set_ylabel("EV rate"); ax31.legend(fontsize=8, ncol=3, frameon=False)
+# ----------- Live simulation: shared environment + per-cell -----------
+# The run happens in a worker process. The engine only exposes Simulation.run(T), so the
+# worker replays the finished field step by step through a bounded queue. The panel is
+# filled at the end of the script: the chart is built once per page run, then only
+# new rows are appended to it until the replay is done.
+# Workers are spawned, never forked: forking the threaded server from the script thread
+# can copy a held lock (imports, logging, tornado) into a child that then deadlocks.
+MP = mp.get_context("spawn")
+
+class _SessionOwner:
+    """Lives in session_state; when Streamlit drops the session it is collected and any
+    worker registered against it is terminated."""
+
+def _terminate(proc):
+    if proc.is_alive():
+        proc.terminate()
+
+def live_state():
+    if "live" not in st.session_state:
+        st.session_state.live = {"proc":None, "q":None, "rows":[], "cells":None, "status":"idle", "error":"",
+                                 "owner":_SessionOwner()}
+    return st.session_state.live
+
+def stop_live(live, status):
+    p = live["proc"]
+    if p is not None:
+        if p.is_alive():
+            p.terminate()
+        p.join(timeout=1.0)
+    live["proc"], live["q"], live["status"] = None, None, status
+
+def drain_live(live, max_msgs=1000):
+    new = []
+    while live["q"] is not None and len(new) < max_msgs:
+        try:
+            msg = live["q"].get_nowait()
+        except queue.Empty:
+            p = live["proc"]
+            if p is not None and not p.is_alive() and p.exitcode not in (0, None):
+                live["error"] = f"worker exited with code {p.exitcode}"
+                stop_live(live, "error")
+            break
+        if msg[0]=="step": new.append({"t":msg[1], **msg[2]})
+        elif msg[0]=="cells": live["cells"] = (msg[1], msg[2])
+        elif msg[0]=="error": live["error"] = msg[1]
+        elif msg[0]=="done": stop_live(live, "error" if live["error"] else "done")
+    live["rows"].extend(new)
+    return new
+
 def pchg(a,b): 
     a=float(a); b=float(b); 
     return 100.0*(b-a)/(abs(a) if abs(a)>1e-9 else 1.0)
-metrics = ["rate","W","S"]
-valsB = [pchg(A[m][-1], B[m][-1]) for m in metrics]
-valsC = [pchg(A[m][-1], C[m][-1]) for m in metrics]
-x = np.arange(len(metrics)); width=0.35
-ax32.bar(x, valsB, width, label="A→B"); ax32.bar(x+width, valsC, width, label="A→C")
-ax32.axhline(0, color="#999", lw=0.5); ax32.set_xticks(x+width/2); ax32.set_xticklabels(metrics)
-ax32.set_ylabel("% change"); ax32.legend(frameon=False, fontsize=8)
-st.pyplot(fig3, clear_figure=True)
+
+st.subheader("Live simulation")
+live = live_state()
+l1, l2, l3, l4 = st.columns([2,2,1,1])
+with l1:
+    live_kind = st.radio("Model", ["single","multi"], horizontal=True,
+                         help="single: Simulation; multi: MultiAgentSimulation with the C1→C2→C3 exchange graph")
+with l2:
+    live_T = st.slider("Timesteps", 10, 1000, 60, 10)
+with l3:
+    if st.button("Run", use_container_width=True):
+        stop_live(live, "cancelled")
+        q = MP.Queue(maxsize=256)
+        proc = MP.Process(target=stream_simulation, args=(q, live_kind, live_T), daemon=True)
+        proc.start()
+        weakref.finalize(live["owner"], _terminate, proc)
+        live.update(proc=proc, q=q, rows=[], cells=None, status="running", error="")
+with l4:
+    if st.button("Cancel", use_container_width=True, disabled=live["status"]!="running"):
+        stop_live(live, "cancelled")
+
+def live_panels(poll_s=0.25):
+    # Any widget interaction interrupts this loop with a rerun; the chart is then rebuilt once
+    live = live_state()
+    st.markdown("**Shared environment** — EV flux by type")
+    chart_slot, status_slot = st.empty(), st.empty()
+    chart = chart_slot.area_chart(pd.DataFrame(live["rows"]).set_index("t")) if live["rows"] else None
+    while True:
+        new = drain_live(live)
+        if new:
+            df_new = pd.DataFrame(new).set_index("t")
+            if chart is None: chart = chart_slot.area_chart(df_new)
+            else: chart.add_rows(df_new)
+        status = live["status"]
+        if status=="running": status_slot.caption(f"simulating, then replaying… {len(live['rows'])} steps received")
+        elif status=="error": status_slot.error(live["error"])
+        elif status=="idle": status_slot.caption("Press Run to simulate; the finished run is replayed here step by step.")
+        else: status_slot.caption(f"{status}: {len(live['rows'])} steps")
+        if status!="running":
+            break
+        time.sleep(poll_s)
+    st.markdown("**Per‑cell** — % change of cell state over the run")
+    if live["cells"]:
+        before, after = live["cells"]
+        metrics = ["S","ghost","fairy","I_mean","E_mean"]
+        st.bar_chart(pd.DataFrame({cid: [pchg(before[cid][m], after[cid][m]) for m in metrics] for cid in after}, index=metrics))
+
+live_box = st.container()
 
 st.divider()
 
 # ----------- Imports & QC -----------
 st.subheader("Instrument imports → standardized CSV + QC")
-kind = st.selectbox("Instrument kind", ["NTA","TRPS","FLOW"])
-up = st.file_uploader("Upload CSV", type=["csv"])
-if up is not None:
-    tmp = f"/tmp/_import_{kind.lower()}.csv"
-    with open(tmp, "wb") as f: f.write(up.read())
-    if kind=="NTA": df = parse_nta_csv(tmp)
-    elif kind=="TRPS": df = parse_trps_csv(tmp)
-    else: df = parse_flow_csv(tmp)
-    st.dataframe(df.head(20))
-    csv_buf = io.StringIO(); df.to_csv(csv_buf, index=False)
-    st.download_button("Download standardized CSV", csv_buf.getvalue(), file_name="standardized.csv", mime="text/csv")
+
+@st.cache_data(show_spinner="Parsing upload…", max_entries=8)
+def parse_upload(kind, data):
+    # Keyed on the uploaded bytes, so re-runs from other widgets never re-parse.
+    # The parsers take a path; the temp copy is removed as soon as parsing is done.
+    import tempfile
+    parse = {"NTA": parse_nta_csv, "TRPS": parse_trps_csv}.get(kind, parse_flow_csv)
+    with tempfile.TemporaryDirectory(prefix="evelution-import-") as d:
+        tmp = os.path.join(d, f"{kind.lower()}.csv")
+        with open(tmp, "wb") as f: f.write(data)
+        df = parse(tmp)
+    csv_text = df.to_csv(index=False)
     qc = {
         "rows": int(df.shape[0]),
         "n_outliers": int(df.get("flag_outlier", pd.Series([False])).sum() if "flag_outlier" in df.columns else 0),
@@ -221,8 +334,20 @@ if up is not None:
         "n_below_loq": int(df.get("flag_below_loq", pd.Series([False])).sum() if "flag_below_loq" in df.columns else 0),
         "instrument_types": [kind]
     }
-    st.json(qc)
-    st.download_button("Download QC JSON", json.dumps(qc, indent=2), file_name="qc.json", mime="application/json")
+    return df.head(20), csv_text, qc
+
+@fragment
+def imports_panel():
+    kind = st.selectbox("Instrument kind", ["NTA","TRPS","FLOW"])
+    up = st.file_uploader("Upload CSV", type=["csv"])
+    if up is not None:
+        head, csv_text, qc = parse_upload(kind, up.getvalue())
+        st.dataframe(head)
+        st.download_button("Download standardized CSV", csv_text, file_name="standardized.csv", mime="text/csv")
+        st.json(qc)
+        st.download_button("Download QC JSON", json.dumps(qc, indent=2), file_name="qc.json", mime="application/json")
+
+imports_panel()
 
 st.divider()
 
@@ -257,13 +382,26 @@ st.divider()
 
 # ----------- Methods exporter -----------
 st.subheader("Methods (Markdown)")
-if st.button("Generate Methods.md"):
-    p = export_methods_md()
-    try:
-        with open(p, "r") as f: md = f.read()
+
+@fragment
+def methods_panel():
+    # Generated once on request and kept in the session; later re-runs only redisplay it
+    if st.button("Generate Methods.md"):
+        try:
+            p = export_methods_md()
+            with open(p, "r") as f: st.session_state.methods_md = f.read()
+        except Exception as e:
+            st.session_state.methods_md = None
+            st.error(str(e))
+    md = st.session_state.get("methods_md")
+    if md:
         st.code(md, language="markdown")
         st.download_button("Download Methods.md", md, file_name="methods.md")
-    except Exception as e:
-        st.error(str(e))
+
+methods_panel()
 
 st.caption("Prototype: swap the demo formulas with your full model hooks when ready.")
+
+# Last, so a running replay never holds up the panels above
+with live_box:
+    live_panels()